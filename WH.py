@@ -20,13 +20,52 @@ import math
 from PIL import Image
 import os
 import datetime
+import shutil
+import subprocess
+import mmap
+import struct
+from concurrent.futures import ThreadPoolExecutor
 
 WINDOW_SIZE = (1280, 720)
+RENDER_SCALE = 0.5
 
 WORMHOLE_RHO = 2.0
 WORMHOLE_A = 2
 WORMHOLE_M = 0.3
 
+FLOW_SPEED_A = 0.03
+FLOW_SPEED_B = -0.03 * 0.7
+
+# Skybox faces are handed to the driver as RGBA8 and compressed on upload
+# (8x smaller than RGBA8) when S3TC is available.
+GL_COMPRESSED_RGB_S3TC_DXT1_EXT = 0x83F0
+
+# Baked skybox files: little-endian (width, height) followed by the six
+# RGBA8 faces in cubemap order. They are uncompressed (~384 MiB for six
+# 4096x4096 faces), so set CACHE_SKYBOXES to False to decode the images on
+# every run instead.
+CACHE_SKYBOXES = True
+CUBEMAP_HEADER = struct.Struct('<II')
+
+PROFILE_SIZE = 1024
+PROFILE_L_MAX = 50.0
+
+def wormhole_profile(l):
+    x = np.maximum(0.0, 2.0 * (np.abs(l) - WORMHOLE_A) / (np.pi * WORMHOLE_M))
+    r = WORMHOLE_RHO + WORMHOLE_M * (x * np.arctan(x) - 0.5 * np.log(1.0 + x * x))
+    dr = 2.0 * np.arctan(x) * np.sign(l) / np.pi
+    return r, dr
+
+def rotation_y(angle, out=None):
+    if out is None:
+        out = np.eye(3, dtype='f4')
+    s = math.sin(angle)
+    c = math.cos(angle)
+    # Row-major bytes of this array are the column-major layout of the GLSL mat3.
+    out[0, 0], out[0, 2] = c, s
+    out[2, 0], out[2, 2] = -s, c
+    return out
+
 class Wormhole3D:
     def __init__(self, window_size):
         self.width, self.height = window_size
@@ -48,12 +87,27 @@ class Wormhole3D:
         self.speed = 3.0
         
         self.velocity = np.array([0.0, 0.0, 0.0], dtype='f4')
+        # Per-frame uniform data is written into these in place. The camera
+        # basis rows are (right, up, fwd), i.e. the columns of the GLSL mat3.
+        self.camera_basis = np.zeros((3, 3), dtype='f4')
+        self.rot_a = np.eye(3, dtype='f4')
+        self.rot_b = np.eye(3, dtype='f4')
         
         pygame.mouse.set_visible(False)
         pygame.event.set_grab(True)
 
         self.is_recording = False
         self.frames_buffer = []
+        # When ffmpeg is installed, recordings are streamed to it as raw frames
+        # instead of being kept in memory for a GIF.
+        self.video_process = None
+        # Recorded frames are read back through two pixel buffers in turn: the
+        # read issued this frame is only mapped on the next one, so the CPU
+        # never waits on the GPU. Image conversion runs on a worker thread.
+        self.readback_buffers = [self.ctx.buffer(reserve=self.width * self.height * 3) for _ in range(2)]
+        self.readback_index = 0
+        self.readback_pending = False
+        self.frame_executor = ThreadPoolExecutor()
         
         try:
             print("Loading skybox for Universe A (from folder 'skybox1')...")
@@ -69,16 +123,35 @@ class Wormhole3D:
             pygame.quit()
             exit()
             
-        self.program['u_resolution'].value = (self.width, self.height)
-        self.program['rho'].value = WORMHOLE_RHO
-        self.program['a'].value = WORMHOLE_A
-        self.program['M_wh'].value = WORMHOLE_M
+        self.profile_texture = self.create_profile_texture()
+        self.profile_texture.use(2)
+        self.program['u_profile'] = 2
+
+        self.render_size = (int(self.width * RENDER_SCALE), int(self.height * RENDER_SCALE))
+        self.program['u_resolution'].value = self.render_size
+
+        # The ray-tracer renders into a reduced-size texture which is then
+        # upscaled to the window with linear filtering.
+        self.frame_texture = self.ctx.texture(self.render_size, 4)
+        self.frame_texture.filter = (moderngl.LINEAR, moderngl.LINEAR)
+        self.frame_texture.repeat_x = False
+        self.frame_texture.repeat_y = False
+        self.frame_texture.use(3)
+        self.frame_fbo = self.ctx.framebuffer(color_attachments=[self.frame_texture])
+        self.blit_program = self.ctx.program(
+            vertex_shader=self.get_vertex_shader(),
+            fragment_shader=self.get_blit_shader()
+        )
+        self.blit_program['u_frame'] = 3
+        self.blit_program['u_resolution'].value = (self.width, self.height)
+
         vertices = np.array([-1.0, -1.0, 1.0, -1.0, -1.0, 1.0, 1.0, 1.0], dtype='f4')
         vbo = self.ctx.buffer(vertices)
         self.vao = self.ctx.vertex_array(self.program, [(vbo, '2f', 'in_vert')])
+        self.blit_vao = self.ctx.vertex_array(self.blit_program, [(vbo, '2f', 'in_vert')])
         self.clock = pygame.time.Clock()
 
-    def load_cubemap(self, folder_name):
+    def skybox_face_paths(self, folder_name):
         script_dir = os.path.dirname(os.path.abspath(__file__)) if '__file__' in locals() else os.getcwd()
         skybox_path = os.path.join(script_dir, folder_name)
         if not os.path.isdir(skybox_path):
@@ -89,18 +162,73 @@ class Wormhole3D:
             face_names = ['px.png', 'nx.png', 'py.png', 'ny.png', 'pz.png', 'nz.png']
         else:
             raise ValueError(f"Unknown naming convention for skybox folder '{folder_name}'")
+        return [os.path.join(skybox_path, name) for name in face_names]
+
+    def decode_cubemap(self, face_paths):
         image_data_list = []
-        with Image.open(os.path.join(skybox_path, face_names[0])) as first_img:
+        with Image.open(face_paths[0]) as first_img:
             size = first_img.size
-        for name in face_names:
-            img_path = os.path.join(skybox_path, name)
+        for img_path in face_paths:
             with Image.open(img_path).convert("RGBA") as img:
                 if img.size != size:
                     img = img.resize(size)
                 image_data_list.append(img.tobytes())
-        final_image_data = b''.join(image_data_list)
-        texture = self.ctx.texture_cube(size, 4, final_image_data)
+        return size, b''.join(image_data_list)
+
+    def bake_cubemap(self, bin_path, size, face_data):
+        # Written under a temporary name so an interrupted bake is never picked up.
+        tmp_path = bin_path + '.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(CUBEMAP_HEADER.pack(*size))
+                f.write(face_data)
+            os.replace(tmp_path, bin_path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def create_cubemap_texture(self, size, face_data):
+        internal_format = None
+        if 'GL_EXT_texture_compression_s3tc' in self.ctx.extensions:
+            internal_format = GL_COMPRESSED_RGB_S3TC_DXT1_EXT
+        texture = self.ctx.texture_cube(size, 4, face_data, internal_format=internal_format)
+        texture.build_mipmaps()
+        texture.filter = (moderngl.LINEAR_MIPMAP_LINEAR, moderngl.LINEAR)
+        return texture
+
+    def load_cubemap(self, folder_name):
+        face_paths = self.skybox_face_paths(folder_name)
+        if not CACHE_SKYBOXES:
+            return self.create_cubemap_texture(*self.decode_cubemap(face_paths))
+        # The .bin next to the folder is only a cache: when it is missing, stale,
+        # truncated or cannot be written, the images are decoded and uploaded
+        # directly. It only skips PNG decoding; DXT1 compression and mipmap
+        # generation still happen in the driver on every upload.
+        bin_path = os.path.dirname(face_paths[0]) + '.bin'
+        if (os.path.exists(bin_path) and os.path.getsize(bin_path) > CUBEMAP_HEADER.size
+                and os.path.getmtime(bin_path) >= max(os.path.getmtime(p) for p in face_paths)):
+            with open(bin_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                size = CUBEMAP_HEADER.unpack_from(mm)
+                if len(mm) == CUBEMAP_HEADER.size + size[0] * size[1] * 4 * 6:
+                    with memoryview(mm)[CUBEMAP_HEADER.size:] as face_data:
+                        return self.create_cubemap_texture(size, face_data)
+        size, face_data = self.decode_cubemap(face_paths)
+        try:
+            self.bake_cubemap(bin_path, size, face_data)
+            print(f"Cached '{folder_name}' in {bin_path} ({os.path.getsize(bin_path) / 2**20:.0f} MiB) for faster startup.")
+        except OSError as e:
+            print(f"Could not cache '{folder_name}' in {bin_path} ({e}); loading it from the images.")
+        return self.create_cubemap_texture(size, face_data)
+
+    def create_profile_texture(self):
+        l = np.linspace(0.0, PROFILE_L_MAX, PROFILE_SIZE)
+        r, dr = wormhole_profile(l)
+        data = np.column_stack([r, dr]).astype('f4')
+        texture = self.ctx.texture((PROFILE_SIZE, 1), 2, data.tobytes(), dtype='f4')
         texture.filter = (moderngl.LINEAR, moderngl.LINEAR)
+        texture.repeat_x = False
+        texture.repeat_y = False
         return texture
 
     def get_vertex_shader(self):
@@ -111,6 +239,8 @@ class Wormhole3D:
         """
 
     def get_fragment_shader(self):
+        # The wormhole parameters never change at runtime, so they are baked in
+        # as constants for the shader compiler to fold.
         return """
             #version 330 core
             out vec4 fragColor;
@@ -118,71 +248,175 @@ class Wormhole3D:
             uniform samplerCube u_skybox_a;
             uniform samplerCube u_skybox_b;
             uniform vec3 u_camera_pos;
-            uniform vec3 u_camera_fwd;
-            uniform vec3 u_camera_right;
-            uniform vec3 u_camera_up;
-            uniform float rho;
-            uniform float a;
-            uniform float M_wh;
-            uniform float u_time; 
-            const float PI = 3.1415926535;
+            uniform mat3 u_camera_basis;
+            uniform sampler2D u_profile;
+            uniform mat3 u_rot_a;
+            uniform mat3 u_rot_b;
+            const float a = %.8f;
+            const float PROFILE_L_MAX = %.8f;
+            const float PROFILE_SIZE = %.1f;
             const float DT = 0.05;
             const int MAX_STEPS = 500;
+            const int STEP_UNROLL = 4;
             const float ZOOM = 1.0;
             const float BOUNDARY = 50.0;
-            const float FLOW_SPEED = 0.03;
-            float LtoR(float l){
-                float x = max(0., 2. * (abs(l) - a) / (PI * M_wh));
-                return rho + M_wh * (x * atan(x) - 0.5 * log(1. + x * x));
-            }
-            float LtoDR(float l){
-                float x = max(0., 2. * (abs(l) - a) / (PI * M_wh));
-                return 2. * atan(x) * sign(l) / PI;
+            const float FAR_FIELD = 16.0;
+            const float DT_GROWTH = 0.3;
+            const float DT_MAX_SCALE = 8.0;
+            const float DT_SLOPE = DT * DT_GROWTH / a;
+            const float PROFILE_U_SCALE = (PROFILE_SIZE - 1.) / (PROFILE_SIZE * PROFILE_L_MAX);
+            const float PROFILE_U_OFFSET = 0.5 / PROFILE_SIZE;
+            // (r, |dr/dl|) at al = |l|, sampled from the table built by
+            // wormhole_profile(). The profile is symmetric in l, so callers carry the
+            // sign themselves. Past the table, clamp-to-edge returns the last sample
+            // and r keeps growing at the edge slope.
+            vec2 LtoRDR(float al){
+                vec2 rd = texture(u_profile, vec2(al * PROFILE_U_SCALE + PROFILE_U_OFFSET, 0.5)).rg;
+                rd.x += rd.y * max(al - PROFILE_L_MAX, 0.);
+                return rd;
             }
-            mat3 rotationY(float angle) {
-                float s = sin(angle);
-                float c = cos(angle);
-                return mat3(c, 0, s, 0, 1, 0, -s, 0, c);
+            // One Euler step of the geodesic in (al, dal, phi), mirroring the ray
+            // into the other universe when it passes through the throat.
+            void geodesicStep(inout float al, inout float dal, inout float sl, inout float phi, inout float r, float H){
+                vec2 rd = LtoRDR(al);
+                r = rd.x;
+                float dt = clamp(DT + DT_SLOPE * (al - a), DT, DT * DT_MAX_SCALE);
+                al += dal * dt;
+                float inv_r = 1.0 / r;
+                float inv_r2 = inv_r * inv_r;
+                phi += H * inv_r2 * dt;
+                dal += H * H * rd.y * inv_r2 * inv_r * dt;
+                if (al < 0.0) {
+                    al = -al;
+                    dal = -dal;
+                    sl = -sl;
+                }
             }
             void main() {
                 vec2 uv = (2. * gl_FragCoord.xy - u_resolution.xy) / u_resolution.y;
-                vec3 ray_dir = normalize(ZOOM * u_camera_fwd + uv.x * u_camera_right + uv.y * u_camera_up);
-                float l = u_camera_pos.z;
+                vec3 ray_dir = normalize(u_camera_basis * vec3(uv, ZOOM));
+                // The ray is integrated in al = |l| with dal = d|l|; sl = sign(l) only
+                // flips when the ray passes through the throat. Since l = sl * al,
+                // dl = sl * dal and dr/dl = sl * |dr/dl|, the signs cancel in every
+                // update below.
+                float sl = u_camera_pos.z >= 0.0 ? 1.0 : -1.0;
+                float al = abs(u_camera_pos.z);
                 float r = length(u_camera_pos);
-                float dl = ray_dir.z;
+                float dal = ray_dir.z * sl;
                 float H = r * length(ray_dir.xy);
                 float phi = 0.;
-                for(int i = 0; i < MAX_STEPS; i++){
-                    r = LtoR(l);
-                    float dr = LtoDR(l);
-                    l += dl * DT;
-                    phi += H / (r * r) * DT;
-                    dl += H * H * dr / (r * r * r) * DT;
-                    if (abs(l) > BOUNDARY) break;
+                // Unrolled by STEP_UNROLL: the exit tests run once per group, which
+                // at most lets a ray take a few extra steps in near-flat space.
+                for(int i = 0; i < MAX_STEPS; i += STEP_UNROLL){
+                    geodesicStep(al, dal, sl, phi, r, H);
+                    geodesicStep(al, dal, sl, phi, r, H);
+                    geodesicStep(al, dal, sl, phi, r, H);
+                    geodesicStep(al, dal, sl, phi, r, H);
+                    if (al > BOUNDARY) break;
+                    // Past FAR_FIELD * a, |dr/dl| > 0.99 and an outgoing ray bends by only
+                    // a few hundredths of a degree more before BOUNDARY, so stop here.
+                    if (al > FAR_FIELD * a && dal > 0.0) break;
                 }
-                float dr = LtoDR(l);
-                float dx = dl * dr * cos(phi) - H / r * sin(phi);
-                float dy = dl * dr * sin(phi) + H / r * cos(phi);
+                float dr = LtoRDR(al).y;
+                float dx = dal * dr * cos(phi) - H / r * sin(phi);
+                float dy = dal * dr * sin(phi) + H / r * cos(phi);
                 vec3 final_dir;
                 final_dir.z = dx;
-                vec2 initial_perp_dir = vec2(0.0);
-                if (length(ray_dir.xy) > 1e-5) {
-                    initial_perp_dir = normalize(ray_dir.xy);
-                }
+                vec2 initial_perp_dir = ray_dir.xy * inversesqrt(max(dot(ray_dir.xy, ray_dir.xy), 1e-20));
                 final_dir.xy = dy * initial_perp_dir;
                 final_dir = normalize(final_dir);
-                mat3 rot_a = rotationY(u_time * FLOW_SPEED);
-                mat3 rot_b = rotationY(-u_time * FLOW_SPEED * 0.7);
-                vec3 rotated_dir_a = rot_a * final_dir;
-                vec3 rotated_dir_b = rot_b * final_dir;
-                if (l >= 0.0) {
-                    fragColor = texture(u_skybox_a, rotated_dir_a);
-                } else {
-                    fragColor = texture(u_skybox_b, rotated_dir_b);
-                }
+                // The rotated direction and its LOD gradients are computed once,
+                // outside the universe selection, so mip selection stays well defined
+                // where neighbouring pixels land in different universes. The fetch
+                // itself still goes to the skybox of the ray's universe.
+                mat3 rot = sl > 0.0 ? u_rot_a : u_rot_b;
+                vec3 sky_dir = rot * final_dir;
+                vec3 sky_dx = rot * dFdx(final_dir);
+                vec3 sky_dy = rot * dFdy(final_dir);
+                fragColor = sl > 0.0 ? textureGrad(u_skybox_a, sky_dir, sky_dx, sky_dy)
+                                     : textureGrad(u_skybox_b, sky_dir, sky_dx, sky_dy);
             }
+        """ % (WORMHOLE_A, PROFILE_L_MAX, PROFILE_SIZE)
+
+    def get_blit_shader(self):
+        return """
+            #version 330 core
+            out vec4 fragColor;
+            uniform vec2 u_resolution;
+            uniform sampler2D u_frame;
+            void main() { fragColor = texture(u_frame, gl_FragCoord.xy / u_resolution); }
         """
 
+    def frame_to_image(self, raw_pixels):
+        # OpenGL rows run bottom-up; the reversed view costs nothing until
+        # Pillow copies it.
+        pixels = np.frombuffer(raw_pixels, dtype=np.uint8).reshape(self.height, self.width, 3)[::-1]
+        image = Image.fromarray(np.ascontiguousarray(pixels))
+        # Palettizing here, off the main thread, leaves the GIF encoder with
+        # nothing to quantize and keeps one byte per pixel in memory.
+        return image.quantize(method=Image.Quantize.MEDIANCUT)
+
+    def collect_frame(self, buffer):
+        raw_pixels = buffer.read()
+        if self.video_process:
+            if self.video_process.poll() is None:
+                try:
+                    self.video_process.stdin.write(raw_pixels)
+                    return
+                except OSError:  # BrokenPipeError if ffmpeg exited meanwhile
+                    pass
+            print("--- ffmpeg stopped accepting frames, recording stopped ---")
+            self.is_recording = False
+            self.save_video()
+            return
+        self.frames_buffer.append(self.frame_executor.submit(self.frame_to_image, raw_pixels))
+
+    def flush_readback(self):
+        if self.readback_pending:
+            self.collect_frame(self.readback_buffers[1 - self.readback_index])
+            self.readback_pending = False
+
+    def start_video(self):
+        timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        self.video_filename = f"wormhole_recording_{timestamp}.mp4"
+        fps = round(self.clock.get_fps()) or 60
+        try:
+            self.video_process = subprocess.Popen(
+                ['ffmpeg', '-y', '-loglevel', 'error',
+                 '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{self.width}x{self.height}', '-r', str(fps), '-i', '-',
+                 '-vf', 'vflip', '-c:v', 'libx264', '-pix_fmt', 'yuv420p', self.video_filename],
+                stdin=subprocess.PIPE
+            )
+        except OSError as e:
+            print(f"Could not start ffmpeg ({e}), falling back to GIF.")
+            self.video_process = None
+        return self.video_process is not None
+
+    def save_video(self):
+        try:
+            self.video_process.stdin.close()
+        except OSError:
+            pass
+        returncode = self.video_process.wait()
+        if returncode == 0:
+            print(f"Video saved successfully: {self.video_filename}")
+        else:
+            print(f"ffmpeg exited with code {returncode}; {self.video_filename} may be missing or incomplete.")
+        self.video_process = None
+
+    def stop_recording(self):
+        self.is_recording = False
+        recording_video = self.video_process is not None
+        self.flush_readback()
+        if not recording_video:
+            print("--- Stopped recording GIF ---")
+            self.save_gif()
+        elif self.video_process:
+            # Still set unless ffmpeg failed on the last frame, which has
+            # already been reported by collect_frame().
+            print("--- Stopped recording video ---")
+            self.save_video()
+
     def save_gif(self):
         if not self.frames_buffer:
             print("No frames were recorded. Nothing to save.")
@@ -196,10 +430,11 @@ class Wormhole3D:
         fps = self.clock.get_fps()
         duration = int(1000 / fps) if fps > 0 else 33 
         
-        self.frames_buffer[0].save(
+        frames = [future.result() for future in self.frames_buffer]
+        frames[0].save(
             filename,
             save_all=True,
-            append_images=self.frames_buffer[1:],
+            append_images=frames[1:],
             optimize=False,
             duration=duration,
             loop=0
@@ -219,67 +454,66 @@ class Wormhole3D:
                 if event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_ESCAPE:
                         running = False
-                    if event.key == pygame.K_w: self.velocity[2] = 1.0
-                    if event.key == pygame.K_s: self.velocity[2] = -1.0
-                    if event.key == pygame.K_a: self.velocity[0] = -1.0
-                    if event.key == pygame.K_d: self.velocity[0] = 1.0
-                    if event.key == pygame.K_e: self.velocity[1] = 1.0
-                    if event.key == pygame.K_q: self.velocity[1] = -1.0
 
                 if event.type == pygame.KEYUP:
-                    if event.key == pygame.K_w and self.velocity[2] == 1.0: self.velocity[2] = 0.0
-                    if event.key == pygame.K_s and self.velocity[2] == -1.0: self.velocity[2] = 0.0
-                    if event.key == pygame.K_a and self.velocity[0] == -1.0: self.velocity[0] = 0.0
-                    if event.key == pygame.K_d and self.velocity[0] == 1.0: self.velocity[0] = 0.0
-                    if event.key == pygame.K_e and self.velocity[1] == 1.0: self.velocity[1] = 0.0
-                    if event.key == pygame.K_q and self.velocity[1] == -1.0: self.velocity[1] = 0.0
-                    
                     if event.key == pygame.K_SPACE:
                         if not self.is_recording:
                             self.is_recording = True
-                            self.frames_buffer.clear()
-                            print("--- Started recording GIF ---")
+                            self.readback_pending = False
+                            if shutil.which('ffmpeg') and self.start_video():
+                                print(f"--- Started recording video to {self.video_filename} ---")
+                            else:
+                                self.frames_buffer.clear()
+                                print("--- Started recording GIF ---")
                         else:
-                            self.is_recording = False
-                            print("--- Stopped recording GIF ---")
-                            self.save_gif()
+                            self.stop_recording()
+
+            keys = pygame.key.get_pressed()
+            self.velocity[0] = float(keys[pygame.K_d]) - float(keys[pygame.K_a])
+            self.velocity[1] = float(keys[pygame.K_e]) - float(keys[pygame.K_q])
+            self.velocity[2] = float(keys[pygame.K_w]) - float(keys[pygame.K_s])
 
             mouse_dx, mouse_dy = pygame.mouse.get_rel()
             self.yaw += mouse_dx * 0.005
             self.pitch -= mouse_dy * 0.005
             self.pitch = max(-math.pi/2 + 0.01, min(self.pitch, math.pi/2 - 0.01))
 
-            cam_fwd = np.array([
-                math.cos(self.yaw) * math.cos(self.pitch),
-                math.sin(self.pitch),
-                math.sin(self.yaw) * math.cos(self.pitch)
-            ], dtype='f4')
-            
-            global_up = np.array([0.0, 1.0, 0.0], dtype='f4')
-            cam_right = np.cross(cam_fwd, global_up)
-            cam_right /= np.linalg.norm(cam_right)
-            
-            move_vec = cam_right * self.velocity[0] + global_up * self.velocity[1] + cam_fwd * self.velocity[2]
-            self.camera_pos += move_vec * self.speed * dt
-            
-            cam_up = np.cross(cam_right, cam_fwd)
+            # With the global up (0, 1, 0), fwd x up normalized and right x fwd
+            # reduce to closed forms in yaw and pitch.
+            cy, sy = math.cos(self.yaw), math.sin(self.yaw)
+            cp, sp = math.cos(self.pitch), math.sin(self.pitch)
+            fx, fy, fz = cy * cp, sp, sy * cp
+            rx, rz = -sy, cy
+            ux, uy, uz = -cy * sp, cp, -sy * sp
+            basis = self.camera_basis
+            basis[0, 0], basis[0, 1], basis[0, 2] = rx, 0.0, rz
+            basis[1, 0], basis[1, 1], basis[1, 2] = ux, uy, uz
+            basis[2, 0], basis[2, 1], basis[2, 2] = fx, fy, fz
+
+            vx, vy, vz = self.velocity
+            step = self.speed * dt
+            self.camera_pos[0] += (rx * vx + fx * vz) * step
+            self.camera_pos[1] += (vy + fy * vz) * step
+            self.camera_pos[2] += (rz * vx + fz * vz) * step
             
-            self.program['u_camera_pos'].value = tuple(self.camera_pos)
-            self.program['u_camera_fwd'].value = tuple(cam_fwd)
-            self.program['u_camera_right'].value = tuple(cam_right)
-            self.program['u_camera_up'].value = tuple(cam_up)
-            self.program['u_time'].value = pygame.time.get_ticks() / 1000.0
+            self.program['u_camera_pos'].write(self.camera_pos)
+            self.program['u_camera_basis'].write(basis)
+            elapsed = pygame.time.get_ticks() / 1000.0
+            self.program['u_rot_a'].write(rotation_y(elapsed * FLOW_SPEED_A, self.rot_a))
+            self.program['u_rot_b'].write(rotation_y(elapsed * FLOW_SPEED_B, self.rot_b))
 
-            self.ctx.clear(0.0, 0.0, 0.0)
+            self.frame_fbo.use()
+            self.frame_fbo.clear(0.0, 0.0, 0.0)
             self.vao.render(moderngl.TRIANGLE_STRIP)
 
-            if self.is_recording:
-
-                raw_pixels = self.ctx.screen.read(components=3, alignment=1)
+            self.ctx.screen.use()
+            self.blit_vao.render(moderngl.TRIANGLE_STRIP)
 
-                image = Image.frombytes('RGB', (self.width, self.height), raw_pixels)
-                image = image.transpose(Image.FLIP_TOP_BOTTOM)
-                self.frames_buffer.append(image)
+            if self.is_recording:
+                self.ctx.screen.read_into(self.readback_buffers[self.readback_index], components=3, alignment=1)
+                self.flush_readback()
+                self.readback_pending = True
+                self.readback_index = 1 - self.readback_index
 
             pygame.display.flip()
             
@@ -287,6 +521,9 @@ class Wormhole3D:
             rec_status = "[REC]" if self.is_recording else ""
             pygame.display.set_caption(f"Wormhole Free-Fly {rec_status} - Pos:({pos[0]:.1f}, {pos[1]:.1f}, {pos[2]:.1f}) - FPS: {self.clock.get_fps():.2f}")
             
+        if self.video_process:
+            self.stop_recording()
+        self.frame_executor.shutdown()
         pygame.quit()
 
 if __name__ == '__main__':